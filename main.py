@@ -1,426 +1,526 @@
 import os
-from elasticsearch import Elasticsearch
+import asyncio
+import functools
 from dotenv import load_dotenv
 from rich.console import Console
+from rich.markup import escape
 from rich.table import Table
-import json
-import requests
-from urllib.parse import urljoin
-
-# Force reload environment variables
-load_dotenv(override=True)
+import orjson
+import re
+import textwrap
+import time
+from dataclasses import dataclass
 
 # Initialize Rich console for pretty output
 console = Console()
 
-# Set the correct values directly
-os.environ['ELASTIC_URL'] = 'https://otel-demo-a5630c.es.us-east-1.aws.elastic.cloud'
-os.environ['ELASTIC_API_KEY'] = 'ApiKey UHd2cXdKWUJ1aV9MRG9GdzAya206MFcwNVRfbkVhUjhIZ05hTEhtNnlzUQ=='
+# Size-0 aggregations are eligible for the shard request cache; a stable
+# preference routes repeat runs to the same shard copies so the cache is hit
+SEARCH_PREFERENCE = "o11ybot"
 
-# Debug: Print environment variables
-console.print("[yellow]Environment Variables:[/yellow]")
-console.print(f"ELASTIC_URL: {os.getenv('ELASTIC_URL')}")
-console.print(f"ELASTIC_API_KEY: {os.getenv('ELASTIC_API_KEY')[:20]}...")  # Only show first 20 chars for security
+# Aggregations repeated within AGG_CACHE_TTL seconds are answered from memory
+AGG_CACHE_TTL = 30
+AGG_CACHE_MAXSIZE = 64
 
-class ElasticAnalyzer:
-    def __init__(self):
-        self.base_url = os.getenv('ELASTIC_URL')
-        self.api_key = os.getenv('ELASTIC_API_KEY')
+# Index discovery is a cheap metadata call, so it gets a much shorter timeout than
+# searches and is not retried; an unresponsive endpoint is reported within seconds
+DISCOVERY_TIMEOUT = 2
+
+# Index lists change rarely, so resolved names are reused for this many seconds
+INDEX_CACHE_TTL = 300
+
+# Size of the shared client's per-node connection pool; keep it at or above
+# the number of requests the analyzer has in flight so none queue for a socket
+CONNECTIONS_PER_NODE = 32
+
+# Breakdown of transaction events by type
+_TRANSACTION_TYPES_AGG = {
+    "terms": {
+        "field": "transaction.type",
+        "size": 10,
+        # transaction.type has only a handful of values, so skip building global ordinals
+        "execution_hint": "map",
+        "collect_mode": "breadth_first"
+    }
+}
+
+# Only the bucket keys and counts of the breakdown are read back
+_TRANSACTION_TYPES_FIELDS = (
+    "aggregations.transaction_types.buckets.key",
+    "aggregations.transaction_types.buckets.doc_count"
+)
+
+# Transaction breakdown for every trace index in one search, bucketed by _index
+ALL_TRANSACTION_TYPES_QUERY = {
+    "size": 0,
+    "aggs": {
+        "by_index": {
+            "terms": {
+                "field": "_index",
+                "size": 1000,
+                "execution_hint": "map"
+            },
+            "aggs": {"transaction_types": _TRANSACTION_TYPES_AGG}
+        }
+    }
+}
+ALL_TRANSACTION_TYPES_FILTER = ",".join(
+    ["aggregations.by_index.sum_other_doc_count", "aggregations.by_index.buckets.key"]
+    + [f"aggregations.by_index.buckets.{field.removeprefix('aggregations.')}" for field in _TRANSACTION_TYPES_FIELDS]
+)
+
+# Backing indices of a data stream are named .ds-<data stream>-<yyyy.MM.dd>-<generation>
+_BACKING_INDEX = re.compile(r"^\.ds-(.+)-\d{4}\.\d{2}\.\d{2}-\d+$")
+
+# Common APM index patterns
+APM_PATTERNS = (
+    "apm-*",
+    "traces-*",
+    "logs-*",
+    "metrics-*"
+)
+# Index filtering happens server-side by sending the patterns as one expression
+APM_INDEX_EXPRESSION = ",".join(APM_PATTERNS)
+
+# Only these patterns hold transaction events; logs and metrics are discovered from metadata
+TRACE_PATTERNS = (
+    "apm-*",
+    "traces-*"
+)
+TRACE_INDEX_EXPRESSION = ",".join(TRACE_PATTERNS)
+
+# ESQL example templates as (title, description, esql) with an {index} placeholder
+_METRICS_EXAMPLES = (
+    (
+        "System Overview",
+        "Analyze CPU, load and memory per host in a single pass",
+        """
+        FROM {index}
+        | WHERE metricset.name == "system"
+        | STATS 
+            avg_cpu = AVG(`system.cpu.cores`),
+            avg_load_1m = AVG(`system.load.1`),
+            avg_load_5m = AVG(`system.load.5`),
+            avg_load_15m = AVG(`system.load.15`),
+            avg_memory_used = AVG(`system.memory.actual.used.pct`),
+            avg_memory_free = AVG(`system.memory.actual.free.pct`)
+            BY host.name
+        | SORT avg_cpu DESC
+        """,
+    ),
+    (
+        "Filesystem Analysis",
+        "Analyze filesystem metrics",
+        """
+        FROM {index}
+        | WHERE metricset.name == "system"
+        | STATS 
+            avg_disk_used = AVG(`system.filesystem.used.pct`),
+            avg_disk_free = AVG(`system.filesystem.free`)
+            BY host.name, `system.filesystem.mount_point`
+        | SORT avg_disk_used DESC
+        """,
+    ),
+)
+
+_APM_EXAMPLES = (
+    (
+        "Transaction Analysis",
+        "Analyze transaction durations and errors by type",
+        """
+        FROM {index}
+        | WHERE transaction.type IS NOT NULL
+        | STATS 
+            avg_duration = AVG(transaction.duration.us),
+            p95_duration = PERCENTILE(transaction.duration.us, 95),
+            count = COUNT(),
+            error_count = SUM(CASE(transaction.result == "error", 1, 0)),
+            avg_error_duration = AVG(CASE(transaction.result == "error", transaction.duration.us, null))
+            BY transaction.type
+        | SORT avg_duration DESC
+        """,
+    ),
+    (
+        "Service Performance",
+        "Analyze performance by service",
+        """
+        FROM {index}
+        | WHERE service.name IS NOT NULL
+        | STATS 
+            avg_duration = AVG(transaction.duration.us),
+            p95_duration = PERCENTILE(transaction.duration.us, 95),
+            count = COUNT()
+            BY service.name
+        | SORT avg_duration DESC
+        """,
+    ),
+    (
+        "Span Analysis",
+        "Analyze spans by type and service",
+        """
+        FROM {index}
+        | WHERE span.type IS NOT NULL
+        | STATS 
+            avg_duration = AVG(span.duration.us),
+            count = COUNT()
+            BY span.type, service.name
+        | SORT avg_duration DESC
+        """,
+    ),
+    (
+        "Response Time Analysis",
+        "Analyze response times by endpoint",
+        """
+        FROM {index}
+        | WHERE transaction.type == "request"
+        | STATS 
+            avg_duration = AVG(transaction.duration.us),
+            p95_duration = PERCENTILE(transaction.duration.us, 95),
+            count = COUNT()
+            BY transaction.name
+        | SORT avg_duration DESC
+        """,
+    ),
+)
+
+@functools.lru_cache(maxsize=2)
+def _examples_for(is_metrics):
+    """Build the dedented ESQL examples for one kind of index"""
+    templates = _METRICS_EXAMPLES if is_metrics else _APM_EXAMPLES
+    return tuple((title, description, textwrap.dedent(esql)) for title, description, esql in templates)
+
+@functools.lru_cache(maxsize=128)
+def _rendered_examples(index):
+    """Fill the index into its ESQL examples once per index"""
+    return tuple(
+        (title, description, esql.format(index=index))
+        for title, description, esql in _examples_for('metrics-' in index)
+    )
+
+def _bucket_table(title, key_label, buckets):
+    """Build a two-column table of terms aggregation buckets"""
+    table = Table(title=title)
+    table.add_column(key_label, style="cyan")
+    table.add_column("Count", style="magenta")
+    for bucket in buckets:
+        table.add_row(bucket['key'], str(bucket['doc_count']))
+    return table
+
+@dataclass(frozen=True, slots=True)
+class EsConfig:
+    """Connection settings, read from the environment once and shared by analyzers"""
+    base_url: str
+    api_key: str
+    timeout: int = 30
+    concurrency: int = 16
+
+    @classmethod
+    def from_env(cls):
+        base_url = os.getenv('ELASTIC_URL')
+        api_key = os.getenv('ELASTIC_API_KEY')
         
-        if not self.base_url or not self.api_key:
+        if not base_url or not api_key:
             raise ValueError("ELASTIC_URL and ELASTIC_API_KEY must be set in .env file")
         
-        console.print(f"[yellow]Attempting to connect to: {self.base_url}[/yellow]")
+        concurrency = int(os.getenv('ES_CONCURRENCY', '16'))
+        if concurrency < 1:
+            raise ValueError("ES_CONCURRENCY must be a positive integer")
         
-        # Initialize Elasticsearch client with proper configuration
-        self.es = Elasticsearch(
-            self.base_url,
-            headers={"Authorization": self.api_key},
-            verify_certs=True,
-            request_timeout=30,
-            max_retries=3,
-            retry_on_timeout=True
-        )
-        self.console = Console()
+        return cls(base_url, api_key, concurrency=concurrency)
 
-    def test_connection(self):
-        """Test the connection to Elasticsearch"""
-        try:
-            # Try a simple search query to test connection
-            response = requests.post(
-                f"{self.base_url}/logs-*/_search",
-                headers={
-                    "Authorization": self.api_key,
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "size": 0,
-                    "query": {
-                        "match_all": {}
-                    }
-                },
-                verify=True
+@functools.cache
+def get_client(config):
+    """Return the process-wide Elasticsearch client for these settings.
+
+    The client owns the connection pool, so sharing it lets every analyzer
+    reuse open TLS connections. It is safe to use from concurrent tasks on
+    the event loop it was first used on.
+    """
+    # Imported here so the transport stack only loads when a client is needed
+    from elasticsearch import AsyncElasticsearch
+    from elasticsearch.serializer import JsonSerializer
+
+    class OrjsonSerializer(JsonSerializer):
+        """Encode request bodies and decode responses with orjson"""
+
+        # Only the codec hooks are replaced; the base loads/dumps still handle empty
+        # and pre-encoded bodies and wrap codec errors in SerializationError
+        def json_loads(self, data):
+            return orjson.loads(data)
+
+        def json_dumps(self, data):
+            return orjson.dumps(data, default=self.default)
+
+    return AsyncElasticsearch(
+        config.base_url,
+        headers={"Authorization": config.api_key},
+        verify_certs=True,
+        http_compress=True,
+        # Enough sockets for the concurrent fan-out; serverless doesn't support sniffing
+        connections_per_node=max(CONNECTIONS_PER_NODE, config.concurrency),
+        sniff_on_start=False,
+        sniff_on_node_failure=False,
+        request_timeout=config.timeout,
+        max_retries=3,
+        retry_on_timeout=True,
+        # Transient overload and gateway errors are retried by the transport itself
+        retry_on_status=(429, 502, 503, 504),
+        serializer=OrjsonSerializer()
+    )
+
+class ElasticAnalyzer:
+    def __init__(self, config=None):
+        self.config = config or EsConfig.from_env()
+        
+        console.print(f"[yellow]Attempting to connect to: {self.config.base_url}[/yellow]")
+        
+        # Share one client (and its connection pool) across analyzers
+        self.es = get_client(self.config)
+        # (index, filter_path, query) -> (expires_at, response)
+        self._agg_cache = {}
+        # index expression -> (expires_at, index names)
+        self._index_cache = {}
+        # Cap in-flight searches so a wide fan-out can't overrun the cluster's search queue
+        self._sem = asyncio.Semaphore(self.config.concurrency)
+
+    def refresh(self):
+        """Drop cached index lists and aggregation responses"""
+        self._index_cache.clear()
+        self._agg_cache.clear()
+
+    async def _cached_search(self, index, query, filter_path, ignore_status=()):
+        """Run a size-0 aggregation, reusing a recent response for the same index and query"""
+        key = (index, filter_path, orjson.dumps(query, option=orjson.OPT_SORT_KEYS))
+        now = time.monotonic()
+        cached = self._agg_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+        
+        async with self._sem:
+            response = await self.es.options(ignore_status=ignore_status).search(
+                index=index,
+                body=query,
+                request_cache=True,
+                preference=SEARCH_PREFERENCE,
+                filter_path=filter_path
             )
-            self.console.print(f"[yellow]Direct HTTP response status: {response.status_code}[/yellow]")
-            if response.status_code != 200:
-                # Escape any special characters in the response text
-                error_text = response.text.replace('[', '\\[').replace(']', '\\]')
-                self.console.print(f"[yellow]Response content: {error_text}[/yellow]")
-                return False
-            
-            # If we get here, the connection is working
-            self.console.print("[green]Successfully connected to Elasticsearch serverless instance[/green]")
-            return True
-        except Exception as e:
-            error_msg = str(e).replace('[', '\\[').replace(']', '\\]')
-            self.console.print(f"[bold red]Error connecting to Elasticsearch: {error_msg}[/bold red]")
-            self.console.print(f"[yellow]Please verify your ELASTIC_URL ({self.base_url}) and ELASTIC_API_KEY are correct[/yellow]")
-            return False
+        if response.meta.status == 200:
+            # Stamp entries once the search completes, so insertion order matches expiry
+            # order and expired entries always sit at the front
+            now = time.monotonic()
+            while self._agg_cache and next(iter(self._agg_cache.values()))[0] <= now:
+                del self._agg_cache[next(iter(self._agg_cache))]
+            # A concurrent search may already have stored this key; replacing it needs no room
+            if self._agg_cache.pop(key, None) is None and len(self._agg_cache) >= AGG_CACHE_MAXSIZE:
+                # Evict the oldest entry
+                del self._agg_cache[next(iter(self._agg_cache))]
+            self._agg_cache[key] = (now + AGG_CACHE_TTL, response)
+        return response
 
-    def get_apm_indices(self):
+    async def get_apm_indices(self):
         """Get all APM-related indices"""
-        try:
-            # Try to search in common APM index patterns
-            apm_patterns = [
-                "apm-*",
-                "traces-*",
-                "logs-*",
-                "metrics-*"
-            ]
-            
-            found_indices = set()
-            for pattern in apm_patterns:
-                response = requests.post(
-                    f"{self.base_url}/{pattern}/_search",
-                    headers={
-                        "Authorization": self.api_key,
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "size": 0,
-                        "query": {
-                            "match_all": {}
-                        }
-                    },
-                    verify=True
-                )
-                if response.status_code == 200:
-                    # Extract index name from response
-                    index_name = response.url.split('/')[-2]  # Get index name from URL
-                    found_indices.add(index_name)
-            
-            return list(found_indices)
-        except Exception as e:
-            self.console.print(f"[bold red]Error getting indices: {str(e)}[/bold red]")
-            return []
+        now = time.monotonic()
+        cached = self._index_cache.get(APM_INDEX_EXPRESSION)
+        if cached and cached[0] > now:
+            return cached[1]
+        
+        # Resolve the common APM patterns from cluster metadata; no shard is searched.
+        # A metadata lookup is quick, so a short timeout makes a dead endpoint fail fast
+        response = await self.es.options(
+            request_timeout=DISCOVERY_TIMEOUT, max_retries=0
+        ).indices.resolve_index(name=APM_INDEX_EXPRESSION)
+        
+        # OTEL data usually lands in data streams, which are listed separately from plain indices
+        # Stored and returned as a tuple so cache hits can be shared without copying
+        indices = tuple(
+            entry['name'] for kind in ('indices', 'data_streams') for entry in response.get(kind, ())
+        )
+        self._index_cache[APM_INDEX_EXPRESSION] = (now + INDEX_CACHE_TTL, indices)
+        return indices
 
-    def analyze_trace_data(self, index):
-        """Analyze trace data in a specific index"""
-        try:
-            # Search for transaction events
-            query = {
-                "size": 0,
-                "aggs": {
-                    "transaction_types": {
-                        "terms": {
-                            "field": "transaction.type",
-                            "size": 10
-                        }
-                    }
-                }
-            }
-            
-            response = self.es.search(index=index, body=query)
-            return response['aggregations']['transaction_types']['buckets']
-        except Exception as e:
-            self.console.print(f"[yellow]Warning: Could not analyze trace data for index {index}: {str(e)}[/yellow]")
-            return []
+    async def analyze_all(self):
+        """Get the transaction breakdown of every trace index with a single search"""
+        response = await self._cached_search(
+            TRACE_INDEX_EXPRESSION, ALL_TRANSACTION_TYPES_QUERY, ALL_TRANSACTION_TYPES_FILTER
+        )
+        
+        by_index = response.get('aggregations', {}).get('by_index', {})
+        if by_index.get('sum_other_doc_count'):
+            size = ALL_TRANSACTION_TYPES_QUERY['aggs']['by_index']['terms']['size']
+            console.print(f"[yellow]Warning: more than {size} trace indices matched; transaction types are only shown for the largest {size}[/yellow]")
+        
+        # Fold backing indices into their data stream, summing counts per transaction type
+        counts = {}
+        for index_bucket in by_index.get('buckets', []):
+            match = _BACKING_INDEX.match(index_bucket['key'])
+            type_counts = counts.setdefault(match.group(1) if match else index_bucket['key'], {})
+            for bucket in index_bucket.get('transaction_types', {}).get('buckets', []):
+                type_counts[bucket['key']] = type_counts.get(bucket['key'], 0) + bucket['doc_count']
+        
+        return {
+            index: [
+                {"key": key, "doc_count": doc_count}
+                for key, doc_count in sorted(type_counts.items(), key=lambda item: item[1], reverse=True)
+            ]
+            for index, type_counts in counts.items()
+        }
 
-    def inspect_fields(self, index):
+    async def inspect_fields(self, index):
         """Inspect available fields in the index"""
         try:
-            # Get a sample document to inspect fields
-            response = requests.post(
-                f"{self.base_url}/{index}/_search",
-                headers={
-                    "Authorization": self.api_key,
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "size": 1,
-                    "query": {
-                        "match_all": {}
-                    }
-                },
-                verify=True
+            # List mapped fields from index metadata instead of fetching a sample document
+            data = await self.es.field_caps(
+                index=index, fields="*", filters="-metadata", ignore_unavailable=True, filter_path="fields"
             )
-            if response.status_code == 200:
-                data = response.json()
-                if data['hits']['hits']:
-                    sample_doc = data['hits']['hits'][0]['_source']
-                    self.console.print("\n[yellow]Available fields in the index:[/yellow]")
-                    self.console.print(json.dumps(sample_doc, indent=2))
-                    return sample_doc
+            fields = sorted(data.get('fields', {}))
+            if fields:
+                console.print("\n[yellow]Available fields in the index:[/yellow]")
+                console.print("\n".join(fields))
+                return fields
             return None
         except Exception as e:
-            self.console.print(f"[bold red]Error inspecting fields: {str(e)}[/bold red]")
+            console.print(f"[bold red]Error inspecting fields: {str(e)}[/bold red]")
             return None
 
-    def analyze_metrics_data(self, index):
-        """Analyze metrics data in a specific index"""
-        try:
-            # First, let's see what metricset names are available
-            query = {
-                "size": 0,
-                "aggs": {
-                    "metricset_names": {
-                        "terms": {
-                            "field": "metricset.name",
-                            "size": 10
+    async def _search_metricsets(self, index):
+        """Aggregate metricset names in an index, with a sample document per metricset"""
+        query = {
+            "size": 0,
+            "aggs": {
+                "metricset_names": {
+                    "terms": {
+                        "field": "metricset.name",
+                        "size": 10
+                    },
+                    "aggs": {
+                        "sample": {
+                            "top_hits": {
+                                "size": 1
+                            }
                         }
                     }
                 }
             }
+        }
+        return await self._cached_search(index, query, "aggregations.metricset_names.buckets", ignore_status=404)
+
+    async def analyze_metrics_data(self, index):
+        """Analyze metrics data in a specific index"""
+        try:
+            # See what metricset names are available, with a sample document for each
+            data = await self._search_metricsets(index)
             
-            response = requests.post(
-                f"{self.base_url}/{index}/_search",
-                headers={
-                    "Authorization": self.api_key,
-                    "Content-Type": "application/json"
-                },
-                json=query,
-                verify=True
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if 'aggregations' in data:
-                    metricset_buckets = data['aggregations']['metricset_names']['buckets']
-                    if metricset_buckets:
-                        self.console.print("\n[yellow]Available metric sets:[/yellow]")
-                        table = Table(title="Metric Sets")
-                        table.add_column("Name", style="cyan")
-                        table.add_column("Count", style="magenta")
-                        
-                        for bucket in metricset_buckets:
-                            table.add_row(bucket['key'], str(bucket['doc_count']))
-                        
-                        self.console.print(table)
-                        
-                        # For each metricset, get a sample document to see available fields
-                        for bucket in metricset_buckets:
-                            metricset_name = bucket['key']
-                            sample_query = {
-                                "size": 1,
-                                "query": {
-                                    "term": {
-                                        "metricset.name": metricset_name
-                                    }
-                                }
-                            }
-                            
-                            sample_response = requests.post(
-                                f"{self.base_url}/{index}/_search",
-                                headers={
-                                    "Authorization": self.api_key,
-                                    "Content-Type": "application/json"
-                                },
-                                json=sample_query,
-                                verify=True
-                            )
-                            
-                            if sample_response.status_code == 200:
-                                sample_data = sample_response.json()
-                                if sample_data['hits']['hits']:
-                                    sample_doc = sample_data['hits']['hits'][0]['_source']
-                                    self.console.print(f"\n[yellow]Sample fields for {metricset_name}:[/yellow]")
-                                    self.console.print(json.dumps(sample_doc, indent=2))
-                    else:
-                        self.console.print("[yellow]No metric sets found in this index[/yellow]")
+            if data.meta.status == 200:
+                metricset_buckets = data.get('aggregations', {}).get('metricset_names', {}).get('buckets', [])
+                if metricset_buckets:
+                    console.print("\n[yellow]Available metric sets:[/yellow]")
+                    console.print(_bucket_table("Metric Sets", "Name", metricset_buckets))
+                    
+                    for bucket in metricset_buckets:
+                        sample_hits = bucket.get('sample', {}).get('hits', {}).get('hits', [])
+                        if sample_hits:
+                            console.print(f"\n[yellow]Sample fields for {bucket['key']}:[/yellow]")
+                            console.print(orjson.dumps(sample_hits[0]['_source'], option=orjson.OPT_INDENT_2).decode())
+                else:
+                    console.print("[yellow]No metric sets found in this index[/yellow]")
             return True
         except Exception as e:
-            self.console.print(f"[bold red]Error analyzing metrics data: {str(e)}[/bold red]")
+            console.print(f"[bold red]Error analyzing metrics data: {str(e)}[/bold red]")
             return False
 
-    def run_analysis(self):
+    async def run_analysis(self):
         """Run the complete analysis"""
+        from elasticsearch import AuthenticationException, ConnectionError as ESConnectionError, ConnectionTimeout
+
         try:
-            # Test connection first
-            if not self.test_connection():
+            # Index discovery is a quick metadata call, so as the first request
+            # it also verifies the connection without waiting on a search
+            try:
+                indices = await self.get_apm_indices()
+            except (ESConnectionError, ConnectionTimeout, AuthenticationException) as e:
+                error_msg = escape(str(e))
+                console.print(f"[bold red]Error connecting to Elasticsearch: {error_msg}[/bold red]")
+                console.print(f"[yellow]Please verify your ELASTIC_URL ({self.config.base_url}) and ELASTIC_API_KEY are correct[/yellow]")
                 return
+            console.print("[green]Successfully connected to Elasticsearch serverless instance[/green]")
 
-            # Get APM indices
-            indices = self.get_apm_indices()
             if not indices:
-                self.console.print("[yellow]No APM indices found. Make sure your OTEL data is being properly ingested.[/yellow]")
+                console.print("[yellow]No APM indices found. Make sure your OTEL data is being properly ingested.[/yellow]")
+                # Wildcard resolution silently skips indices the key can't see metadata for
+                console.print("[yellow]If data is present, check that the API key has the view_index_metadata privilege on the APM indices[/yellow]")
                 return
 
-            self.console.print(f"\n[bold green]Found {len(indices)} APM indices[/bold green]")
+            console.print(f"\n[bold green]Found {len(indices)} APM indices[/bold green]")
+            
+            # Run the trace breakdown alongside the metricset warm-up so the loop below renders from cache;
+            # metricset failures are reported by analyze_metrics_data when it retries
+            metrics_tasks = [self._search_metricsets(index) for index in indices if 'metrics-' in index]
+            trace_data_by_index, *_ = await asyncio.gather(
+                self.analyze_all(), *metrics_tasks, return_exceptions=True
+            )
+            if isinstance(trace_data_by_index, Exception):
+                console.print(f"[yellow]Warning: Could not analyze trace data: {escape(str(trace_data_by_index))}[/yellow]")
+                trace_data_by_index = {}
+            
+            # One combined table covers the transaction types of every index
+            if any(trace_data_by_index.values()):
+                table = Table(title="Transaction Types")
+                table.add_column("Index", style="blue")
+                table.add_column("Type", style="cyan")
+                table.add_column("Count", style="magenta")
+                for index, trace_data in trace_data_by_index.items():
+                    for bucket in trace_data:
+                        table.add_row(index, bucket['key'], str(bucket['doc_count']))
+                console.print(table)
             
             for index in indices:
-                self.console.print(f"\n[bold blue]Analyzing index: {index}[/bold blue]")
+                trace_data = trace_data_by_index.get(index)
+                if not trace_data and 'metrics-' not in index:
+                    # Nothing to base transaction examples on
+                    console.print(f"\n[yellow]Skipping {index}: no transaction data[/yellow]")
+                    continue
+                
+                console.print(f"\n[bold blue]Analyzing index: {index}[/bold blue]")
                 
                 if 'metrics-' in index:
                     # For metrics indices, analyze the metrics data
-                    self.analyze_metrics_data(index)
+                    await self.analyze_metrics_data(index)
                 
                 # Generate and display ESQL examples
                 examples = self.generate_esql_examples(index)
                 
                 for example in examples:
-                    self.console.print(f"\n[bold yellow]{example['title']}[/bold yellow]")
-                    self.console.print(f"[italic]{example['description']}[/italic]")
-                    self.console.print("[green]ESQL Example:[/green]")
-                    self.console.print(example['esql'])
+                    console.print(f"\n[bold yellow]{example['title']}[/bold yellow]")
+                    console.print(f"[italic]{example['description']}[/italic]")
+                    console.print("[green]ESQL Example:[/green]")
+                    console.print(example['esql'])
                 
         except Exception as e:
-            error_msg = str(e).replace('[', '\\[').replace(']', '\\]')
-            self.console.print(f"[bold red]Error during analysis: {error_msg}[/bold red]")
+            error_msg = escape(str(e))
+            console.print(f"[bold red]Error during analysis: {error_msg}[/bold red]")
 
     def generate_esql_examples(self, index, sample_doc=None):
         """Generate ESQL examples based on the data found"""
-        examples = []
-        
-        # Check if this is a metrics index
-        if 'metrics-' in index:
-            # Metrics-specific examples
-            examples.append({
-                "title": "System Metrics Analysis",
-                "description": "Analyze system metrics over time",
-                "esql": f"""
-                FROM {index}
-                | WHERE metricset.name == "system"
-                | STATS 
-                    avg_cpu = AVG(`system.cpu.cores`),
-                    avg_memory = AVG(`system.memory.actual.used.pct`)
-                    BY host.name
-                | SORT avg_cpu DESC
-                """
-            })
-
-            examples.append({
-                "title": "System Load Analysis",
-                "description": "Analyze system load metrics",
-                "esql": f"""
-                FROM {index}
-                | WHERE metricset.name == "system"
-                | STATS 
-                    avg_load_1m = AVG(`system.load.1`),
-                    avg_load_5m = AVG(`system.load.5`),
-                    avg_load_15m = AVG(`system.load.15`)
-                    BY host.name
-                | SORT avg_load_1m DESC
-                """
-            })
-
-            examples.append({
-                "title": "Memory Usage Analysis",
-                "description": "Analyze memory usage metrics",
-                "esql": f"""
-                FROM {index}
-                | WHERE metricset.name == "system"
-                | STATS 
-                    avg_memory_used = AVG(`system.memory.actual.used.pct`),
-                    avg_memory_free = AVG(`system.memory.actual.free.pct`)
-                    BY host.name
-                | SORT avg_memory_used DESC
-                """
-            })
-
-            examples.append({
-                "title": "Filesystem Analysis",
-                "description": "Analyze filesystem metrics",
-                "esql": f"""
-                FROM {index}
-                | WHERE metricset.name == "system"
-                | STATS 
-                    avg_disk_used = AVG(`system.filesystem.used.pct`),
-                    avg_disk_free = AVG(`system.filesystem.free`)
-                    BY host.name, `system.filesystem.mount_point`
-                | SORT avg_disk_used DESC
-                """
-            })
-
-        else:
-            # Transaction and span analysis examples
-            examples.append({
-                "title": "Transaction Duration Analysis",
-                "description": "Analyze transaction durations by type",
-                "esql": f"""
-                FROM {index}
-                | WHERE transaction.type IS NOT NULL
-                | STATS 
-                    avg_duration = AVG(transaction.duration.us),
-                    p95_duration = PERCENTILE(transaction.duration.us, 95),
-                    count = COUNT()
-                    BY transaction.type
-                | SORT avg_duration DESC
-                """
-            })
-
-            examples.append({
-                "title": "Error Analysis",
-                "description": "Analyze errors by transaction type",
-                "esql": f"""
-                FROM {index}
-                | WHERE transaction.result == "error"
-                | STATS 
-                    error_count = COUNT(),
-                    avg_duration = AVG(transaction.duration.us)
-                    BY transaction.type
-                | SORT error_count DESC
-                """
-            })
-
-            examples.append({
-                "title": "Service Performance",
-                "description": "Analyze performance by service",
-                "esql": f"""
-                FROM {index}
-                | WHERE service.name IS NOT NULL
-                | STATS 
-                    avg_duration = AVG(transaction.duration.us),
-                    p95_duration = PERCENTILE(transaction.duration.us, 95),
-                    count = COUNT()
-                    BY service.name
-                | SORT avg_duration DESC
-                """
-            })
-
-            examples.append({
-                "title": "Span Analysis",
-                "description": "Analyze spans by type and service",
-                "esql": f"""
-                FROM {index}
-                | WHERE span.type IS NOT NULL
-                | STATS 
-                    avg_duration = AVG(span.duration.us),
-                    count = COUNT()
-                    BY span.type, service.name
-                | SORT avg_duration DESC
-                """
-            })
-
-            examples.append({
-                "title": "Response Time Analysis",
-                "description": "Analyze response times by endpoint",
-                "esql": f"""
-                FROM {index}
-                | WHERE transaction.type == "request"
-                | STATS 
-                    avg_duration = AVG(transaction.duration.us),
-                    p95_duration = PERCENTILE(transaction.duration.us, 95),
-                    count = COUNT()
-                    BY transaction.name
-                | SORT avg_duration DESC
-                """
-            })
-
-        return examples
-
-def main():
-    analyzer = ElasticAnalyzer()
-    analyzer.run_analysis()
+        return [
+            {"title": title, "description": description, "esql": esql}
+            for title, description, esql in _rendered_examples(index)
+        ]
+
+async def main():
+    # Force reload environment variables
+    load_dotenv(override=True)
+
+    # Debug: Print environment variables
+    console.print("[yellow]Environment Variables:[/yellow]")
+    console.print(f"ELASTIC_URL: {os.getenv('ELASTIC_URL')}")
+    console.print(f"ELASTIC_API_KEY: {(os.getenv('ELASTIC_API_KEY') or '')[:20]}...")  # Only show first 20 chars for security
+
+    analyzer = ElasticAnalyzer(EsConfig.from_env())
+    try:
+        await analyzer.run_analysis()
+    finally:
+        await analyzer.es.close()
+        get_client.cache_clear()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    asyncio.run(main()) 
\ No newline at end of file